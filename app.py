@@ -1,22 +1,43 @@
 import os
-import json
-import time
-from typing import Dict, List
+import asyncio
+import re
+import uuid
+from contextlib import asynccontextmanager
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Tuple
 from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
-from groq import Groq, APIConnectionError, AuthenticationError, RateLimitError, APIError
+from groq import AsyncGroq, DefaultAsyncHttpxClient, APIConnectionError, AuthenticationError, RateLimitError, APIError
+import httpx
+import orjson
 import uvicorn
 
 # Load environment variables
 load_dotenv()
 
+# --- Startup Hooks ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the Groq key check (opt-in) and warm-up (opt-out) in the background so the server binds its port right away."""
+    background_tasks = []
+    if os.getenv("SAKHI_VALIDATE_KEY") == "1":
+        background_tasks.append(asyncio.create_task(validate_groq_key()))
+    if os.getenv("SAKHI_WARMUP", "1") != "0":
+        background_tasks.append(asyncio.create_task(warm_up_groq()))
+    yield
+    for task in background_tasks:
+        task.cancel()
+
 # --- FastAPI App Initialization ---
 app = FastAPI(
     title="Sakhi - Women Safety AI",
     description="An empathetic and action-oriented AI companion for women's safety and support in India.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # --- CORS Middleware ---
@@ -30,16 +51,48 @@ app.add_middleware(
 )
 
 # --- Pydantic Models ---
+MAX_MESSAGE_LENGTH = 2000  # Longer messages are rejected with a 422 before any LLM call
+
 class ChatPayload(BaseModel):
-    message: str
+    message: str = Field(..., min_length=1, max_length=MAX_MESSAGE_LENGTH)
+    session_id: str | None = Field(None, max_length=128)  # Omitted: the server issues a new one
 
 class ChatResponse(BaseModel):
     reply: str
+    session_id: str | None = None  # Clients send this back to continue the conversation
 
 # =============================================================================
 # 📚 RESOURCE DATABASE & MODEL CONFIG
 # =============================================================================
 LLM_MODEL = "llama3-70b-8192"
+CLASSIFIER_MODEL = "llama3-8b-8192"  # Picking one label does not need the 70B model
+CHAT_HISTORY_WINDOW = 6  # Past messages sent to the LLM as conversation context
+MAX_SESSIONS = 10_000
+SESSION_TTL_SECONDS = 3600  # Idle sessions are dropped after an hour
+# Reply budgets per persona; the short-format intents are capped so a runaway generation can't
+# stretch tail latency. Left with headroom because Devanagari text takes several tokens per word.
+# EMERGENCY keeps the full budget: a cut-off Hindi/Marathi reply would lose its final "/alert" step.
+MAX_TOKENS_BY_INTENT = {
+    "DEFAULT": 350,
+    "EMERGENCY": 350,
+    "LEGAL": 200,
+    "CYBERCRIME": 250,
+    "EMOTIONAL_SUPPORT": 120,
+}
+MAX_CONCURRENT_GROQ = int(os.getenv("MAX_CONCURRENT_GROQ", "40"))  # Tune to the Groq account's rate limits
+GROQ_SLOT_TIMEOUT_SECONDS = 10.0  # How long a request waits for a free slot before getting the busy reply
+INTENT_CACHE_SIZE = 4096
+INTENT_CACHE_MAX_KEY_LENGTH = 128  # Long messages rarely repeat, so they are not worth a cache slot
+INTENT_MAX_TOKENS = 16  # Room for a preamble like "Classification: EMOTIONAL_SUPPORT" (about eight tokens)
+INTENT_LABEL_RE = re.compile(r"EMOTIONAL[ _]SUPPORT|EMERGENCY|CYBERCRIME|LEGAL|GENERAL")
+# Only these exact greetings/acknowledgements skip the LLM classifier; anything else unmatched is classified
+PHATIC_MESSAGES = frozenset({
+    "hi", "hii", "hello", "hey", "thanks", "thank you", "thankyou", "ok", "okay", "bye",
+    "good morning", "good night", "namaste", "shukriya", "dhanyavad", "नमस्ते", "धन्यवाद"
+})
+GROQ_TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+# Idle connections are kept for a minute (SDK default: 5s) so quiet periods don't cost a fresh TLS handshake
+GROQ_CONNECTION_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
 
 def load_resources():
     """Loads static resources for the chatbot."""
@@ -162,172 +215,476 @@ MASTER_SYSTEM_PROMPTS = {
     },
 }
 
+# Add specific instruction to prevent question repetition
+ANTI_REPETITION_RULE = """
+        CRITICAL: Do NOT repeat or translate the user's question. Answer directly without echoing their words.
+        """
+
+# Only the resource sections each persona actually uses are sent, keeping prompts (and prefill) small
+INTENT_RESOURCES = {
+    "DEFAULT": ["helplines", "ngos"],
+    "EMERGENCY": ["helplines"],
+    "LEGAL": ["legal_info", "helplines", "ngos"],
+    "CYBERCRIME": ["helplines"],
+    "EMOTIONAL_SUPPORT": ["helplines"],
+}
+RESOURCE_LABELS = {"helplines": "Available Helplines", "ngos": "Available NGOs", "legal_info": "Available Legal Info"}
+
+def build_static_system_prompts() -> Dict[str, str]:
+    """Renders every intent's system prompt once. Nothing user-specific goes in here, so the
+    prefix Groq sees is byte-identical across turns and users and can be served from its prompt cache."""
+    prompts = {}
+    for intent, prompt_data in MASTER_SYSTEM_PROMPTS.items():
+        resource_lines = "".join(
+            f"        - {RESOURCE_LABELS[section]}: {orjson.dumps(RESOURCES[section], option=orjson.OPT_SORT_KEYS).decode()}\n"
+            for section in INTENT_RESOURCES[intent]
+        )
+        resource_info = f"\n        AVAILABLE RESOURCES:\n{resource_lines}        "
+        prompts[intent] = f"{prompt_data['persona']}\n{resource_info}\nRULES:\n{prompt_data['rules']}\n{ANTI_REPETITION_RULE}"
+    return prompts
+
+STATIC_SYSTEM_PROMPTS = build_static_system_prompts()
+
+# =============================================================================
+# 🧭 KEYWORD INTENT ROUTER
+# =============================================================================
+# A message is routed by keyword only when it matches exactly one intent; anything else goes to the LLM
+INTENT_KEYWORDS = {
+    "EMERGENCY": [
+        "emergency", "save me", "danger", "in danger", "unsafe", "attacked", "attacking me",
+        "being followed", "following me", "kidnap", "kidnapped", "call police", "call the police",
+        "rape", "raped", "raping", "assault", "assaulted", "abuse", "abused", "abuses", "abusing", "abusive",
+        "hit me", "hits me", "hitting me", "beat me", "beats me", "beating me", "beaten", "violence", "violent",
+        "harass", "harassed", "harasses", "harassing", "stalk", "stalked", "stalker", "stalking",
+        "bachao", "बचाओ", "खतरा", "वाचवा"
+    ],
+    "CYBERCRIME": [
+        "hacked", "hacker", "otp", "morphed", "blackmail", "blackmailing", "sextortion", "fake profile",
+        "cyber", "cybercrime", "online harassment", "leaked photos", "leaked my photos"
+    ],
+    "LEGAL": [
+        "legal", "legal help", "legal advice", "the law", "which law", "what law", "any law", "my rights",
+        "divorce", "dowry", "lawyer", "court", "protection order", "custody", "498a",
+        "fir file", "file fir", "file an fir", "file a fir", "lodge fir", "lodge an fir", "police complaint",
+        "kanoon", "kanooni madad", "कानून", "एफआईआर"
+    ],
+    "EMOTIONAL_SUPPORT": [
+        "sad", "alone", "lonely", "cry", "crying", "depressed", "anxious", "hopeless", "stressed",
+        "heartbroken", "scared", "afraid", "darr", "udaas", "akeli", "दुखी", "उदास", "अकेली", "डर"
+    ],
+}
+
+# A message that is little more than "help" or "police" is treated as a distress call; in longer
+# messages these words are too ambiguous ("help me write...", "police complaint") to route on their own
+SHORT_DISTRESS_MAX_WORDS = 3
+SHORT_DISTRESS_RE = re.compile(r"\b(?:help|madad|police)\b|मदद|पुलिस", re.IGNORECASE)
+# Longer messages that only mention an EMERGENCY word are often about the past or a question about
+# the law ("what is the punishment for rape"), and a negation or "safe" flips the meaning, so both go to the LLM
+EMERGENCY_KEYWORD_MAX_WORDS = 6
+NEGATION_OR_SAFE_RE = re.compile(
+    r"\b(?:not|no|never|no longer|anymore|safe|nahi|nahin)\b|n't\b|नहीं|सुरक्षित", re.IGNORECASE
+)
+
+def build_intent_patterns() -> Dict[str, re.Pattern]:
+    """Compiles each intent's keywords into one alternation. Word boundaries are only applied to
+    Latin-script keywords, since Devanagari vowel signs are not word characters for `re`."""
+    return {
+        intent: re.compile(
+            "|".join(rf"\b{re.escape(kw)}\b" if kw.isascii() else re.escape(kw) for kw in keywords),
+            re.IGNORECASE
+        )
+        for intent, keywords in INTENT_KEYWORDS.items()
+    }
+
+INTENT_PATTERNS = build_intent_patterns()
+
+# Caps outbound Groq calls per worker; excess requests wait here instead of piling into RateLimitErrors
+groq_slots = asyncio.Semaphore(MAX_CONCURRENT_GROQ)
+
+class GroqBusyError(Exception):
+    """Raised when no Groq slot frees up within GROQ_SLOT_TIMEOUT_SECONDS."""
+
+@asynccontextmanager
+async def groq_slot():
+    """Holds one Groq slot, giving up after a bounded wait so overload gets a reply instead of a hang."""
+    try:
+        await asyncio.wait_for(groq_slots.acquire(), GROQ_SLOT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise GroqBusyError(f"No Groq slot free after {GROQ_SLOT_TIMEOUT_SECONDS}s")
+    try:
+        yield
+    finally:
+        groq_slots.release()
+
+# Intent depends only on the message text, so classifications are shared across all sessions
+intent_cache: LRUCache = LRUCache(maxsize=INTENT_CACHE_SIZE)
+
 # =============================================================================
 # 🤖 SAKHI CHATBOT CLASS
 # =============================================================================
 class SakhiChatbot:
     """The main class for the Sakhi Chatbot, managing state, intent, and responses."""
-    def __init__(self, client: Groq):
+    # One instance lives per session, so drop the per-instance __dict__
+    __slots__ = ("client", "chat_history", "safety_status", "user_location", "safe_circle")
+
+    def __init__(self, client: AsyncGroq):
         """Initializes the chatbot's state."""
         self.client = client
-        self.chat_history: List[Dict] = []
+        self.chat_history: Deque[Tuple[str, str]] = deque(maxlen=CHAT_HISTORY_WINDOW)  # (role, content)
         self.safety_status = "safe"  # Can be 'safe', 'unsafe', 'monitoring'
         self.user_location = None
         self.safe_circle = ["+919876543210", "+918765432109"] # Mock data
 
-    def _call_groq_api(self, messages: list, temperature: float = 0.4, max_tokens: int = 350) -> str:
+    def _api_error_reply(self, error: Exception) -> str:
+        """Maps a failed Groq call to a safe reply that always points to a helpline."""
+        if isinstance(error, (RateLimitError, GroqBusyError)):
+            return f"⚠️ I'm getting a lot of requests right now. Please wait a moment. For immediate help, call the National Emergency Helpline: {RESOURCES['helplines']['national_emergency']}."
+        if isinstance(error, APIError):
+            print(f"API Error: {error}")
+            return f"⚠️ My systems are facing a technical issue. For immediate help, please call the Women's Helpline: {RESOURCES['helplines']['women_helpline']}."
+        print(f"An unexpected error occurred: {error}")
+        return f"⚠️ I'm sorry, an unexpected error occurred. Please try again. If you need urgent assistance, call {RESOURCES['helplines']['national_emergency']}."
+
+    async def _call_groq_api(self, messages: list, temperature: float = 0.4, max_tokens: int = 350) -> str:
         """Helper function to call the Groq API with robust error handling."""
         try:
-            response = self.client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            async with groq_slot():
+                response = await self.client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens
+                )
             return response.choices[0].message.content
-        except RateLimitError:
-            return f"⚠️ I'm getting a lot of requests right now. Please wait a moment. For immediate help, call the National Emergency Helpline: {RESOURCES['helplines']['national_emergency']}."
-        except APIError as e:
-            print(f"API Error: {e}")
-            return f"⚠️ My systems are facing a technical issue. For immediate help, please call the Women's Helpline: {RESOURCES['helplines']['women_helpline']}."
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            return f"⚠️ I'm sorry, an unexpected error occurred. Please try again. If you need urgent assistance, call {RESOURCES['helplines']['national_emergency']}."
+            return self._api_error_reply(e)
+
+    async def _stream_groq_api(self, messages: list, temperature: float = 0.4, max_tokens: int = 350) -> AsyncIterator[str]:
+        """Streaming variant of _call_groq_api that yields text chunks as Groq generates them."""
+        # A background task drains Groq into a queue, so the slot is held only while Groq is
+        # generating and a slow SSE reader can't keep it from other requests
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async with groq_slot():
+                    stream = await self.client.chat.completions.create(
+                        model=LLM_MODEL,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=True
+                    )
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            chunks.put_nowait(delta)
+            except Exception as e:
+                chunks.put_nowait(self._api_error_reply(e))
+            finally:
+                chunks.put_nowait(None)
+
+        pump_task = asyncio.create_task(pump())
+        try:
+            while (part := await chunks.get()) is not None:
+                yield part
+        finally:
+            # Stops the Groq stream if the client disconnects mid-reply
+            pump_task.cancel()
+
+    async def classify_intent(self, user_input: str, use_llm_fallback: bool = True, user_input_lower: str | None = None) -> str:
+        """Routes the message by keyword first and only asks the LLM when no keyword matches or the match is ambiguous."""
+        matched = [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(user_input)]
+        word_count = len(user_input.split())
+        if matched == ["EMERGENCY"]:
+            if word_count <= EMERGENCY_KEYWORD_MAX_WORDS and not NEGATION_OR_SAFE_RE.search(user_input):
+                return "EMERGENCY"
+        elif len(matched) == 1:
+            return matched[0]
+        elif not matched and word_count <= SHORT_DISTRESS_MAX_WORDS and SHORT_DISTRESS_RE.search(user_input):
+            return "EMERGENCY"
+
+        # Collapsing case and whitespace lets trivially different repeats share one cache entry
+        if user_input_lower is None:
+            user_input_lower = user_input.lower()
+        cache_key = " ".join(user_input_lower.split())
+        if not use_llm_fallback or cache_key.strip(" .,!?") in PHATIC_MESSAGES:
+            return "GENERAL"
+
+        cacheable = len(cache_key) <= INTENT_CACHE_MAX_KEY_LENGTH
+        cached_intent = intent_cache.get(cache_key) if cacheable else None
+        if cached_intent:
+            return cached_intent
 
-    def classify_intent(self, user_input: str) -> str:
-        """Uses the LLM to classify the user's intent with high accuracy."""
         classification_prompt = f"""
         Analyze the user's message and classify its primary intent into ONE of the following categories:
         'EMERGENCY', 'LEGAL', 'CYBERCRIME', 'EMOTIONAL_SUPPORT', or 'GENERAL'.
         User's message: "{user_input}"
+        Reply with the category name only.
         Classification:
         """
         messages = [{"role": "user", "content": classification_prompt}]
-        # Use a low-cost, fast model for classification if available, or the main one.
-        response = self._call_groq_api(messages, temperature=0.0, max_tokens=20)
-        intent = response.strip().upper().replace("'", "").replace('"',"")
-
-        if intent in MASTER_SYSTEM_PROMPTS:
-            return intent
-        return "GENERAL"
+        try:
+            # Use a low-cost, fast model for classification; the main model is kept for replies.
+            async with groq_slot():
+                response = await self.client.chat.completions.create(
+                    model=CLASSIFIER_MODEL,
+                    messages=messages,
+                    temperature=0.0,
+                    max_tokens=INTENT_MAX_TOKENS
+                )
+        except Exception as e:
+            # The reply call reports API problems to the user; here we just fall back to the default persona
+            print(f"Intent classification failed: {e}")
+            return "GENERAL"
+
+        # The verdict comes last when the model explains itself ("not an EMERGENCY, it is LEGAL")
+        labels = INTENT_LABEL_RE.findall((response.choices[0].message.content or "").upper())
+        if not labels:
+            return "GENERAL"
+        intent = labels[-1].replace(" ", "_")
+        if cacheable:
+            intent_cache[cache_key] = intent
+        return intent
 
     def _handle_special_commands(self, user_input: str) -> str | None:
         """Handles special slash commands for quick actions."""
-        if user_input.lower().startswith("/location"):
-            try:
-                self.user_location = user_input.split(" ", 1)[1].strip()
-                return f"Thank you. I've noted your location as {self.user_location}. This will help me provide more specific resources if you need them."
-            except IndexError:
-                return "Please provide a location after the command, like: /location Mumbai"
-        
-        if user_input.lower() == "/alert":
-            return self.send_safe_circle_alert()
-        return None
+        # Most messages are not commands, so skip the parsing entirely for them
+        if not user_input.startswith("/"):
+            return None
+
+        command, _, argument = user_input.partition(" ")
+        handler = self.SLASH_COMMANDS.get(command.lower())
+        return handler(self, argument.strip()) if handler else None
+
+    def _set_location(self, location: str) -> str:
+        """Handles /location <place>."""
+        if not location:
+            return "Please provide a location after the command, like: /location Mumbai"
+        self.user_location = location
+        return f"Thank you. I've noted your location as {self.user_location}. This will help me provide more specific resources if you need them."
+
+    def _alert(self, _argument: str) -> str:
+        """Handles /alert."""
+        return self.send_safe_circle_alert()
+
+    SLASH_COMMANDS = {"/location": _set_location, "/alert": _alert}
 
     def send_safe_circle_alert(self) -> str:
         """Simulates sending an alert to pre-configured trusted contacts."""
         print("\n[SYSTEM ACTION: Sending alert to Safe Circle...]")
         for number in self.safe_circle:
             print(f"  > SMS sent to {number}")
-            time.sleep(0.1) # Simulate API call
         
         location_info = f"at location {self.user_location}" if self.user_location else "at their last known location"
         alert_message = f"Your Safe Circle has been alerted with the message: 'Emergency! Need help {location_info}.' Please also call {RESOURCES['helplines']['national_emergency']} immediately."
         self.safety_status = "unsafe"
         return alert_message
 
-    def process_message(self, user_input: str) -> str:
-        """Main function to generate a context-aware and safe response for the API."""
-        command_response = self._handle_special_commands(user_input)
-        if command_response:
-            return command_response
-
-        intent = self.classify_intent(user_input)
+    async def _build_messages(self, user_input: str) -> Tuple[list, int]:
+        """Classifies the message, updates the safety status and assembles the prompt and reply budget for Groq."""
+        user_input_lower = user_input.lower()
+        intent = await self.classify_intent(user_input, user_input_lower=user_input_lower)
         
         if intent == "EMERGENCY":
             self.safety_status = "unsafe"
-        elif "safe" in user_input.lower() or intent == "GENERAL":
+        elif "safe" in user_input_lower or intent == "GENERAL":
             if self.safety_status == "unsafe":
                 self.safety_status = "monitoring"
         
-        prompt_data = MASTER_SYSTEM_PROMPTS.get(intent, MASTER_SYSTEM_PROMPTS["DEFAULT"])
-        
+        static_prompt = STATIC_SYSTEM_PROMPTS.get(intent, STATIC_SYSTEM_PROMPTS["DEFAULT"])
+        # The volatile context goes last, right before the user's message, to keep the cacheable prefix stable
         contextual_info = f"""
         CURRENT CONTEXT:
         - User's Safety Status: {self.safety_status}
         - User's Location: {self.user_location or 'Not Provided'}
-        - Available Helplines: {json.dumps(RESOURCES['helplines'])}
-        - Available NGOs: {json.dumps(RESOURCES['ngos'])}
-        - Available Legal Info: {json.dumps(RESOURCES['legal_info'])}
         """
-        
-        # Add specific instruction to prevent question repetition
-        anti_repetition_rule = """
-        CRITICAL: Do NOT repeat or translate the user's question. Answer directly without echoing their words.
-        """
-        
-        full_system_prompt = f"{prompt_data['persona']}\n{contextual_info}\nRULES:\n{prompt_data['rules']}\n{anti_repetition_rule}"
 
         messages = [
-            {"role": "system", "content": full_system_prompt},
-            *self.chat_history[-6:],
+            {"role": "system", "content": static_prompt},
+            *({"role": role, "content": content} for role, content in self.chat_history),
+            {"role": "system", "content": contextual_info},
             {"role": "user", "content": user_input}
         ]
+        return messages, MAX_TOKENS_BY_INTENT.get(intent, MAX_TOKENS_BY_INTENT["DEFAULT"])
 
-        response_text = self._call_groq_api(messages)
-        
-        self.chat_history.extend([
-            {"role": "user", "content": user_input},
-            {"role": "assistant", "content": response_text}
-        ])
+    def _remember(self, user_input: str, response_text: str):
+        """Appends a completed exchange to the chat history."""
+        self.chat_history.extend([("user", user_input), ("assistant", response_text)])
+
+    async def process_message(self, user_input: str) -> str:
+        """Main function to generate a context-aware and safe response for the API."""
+        command_response = self._handle_special_commands(user_input)
+        if command_response:
+            return command_response
+
+        messages, max_tokens = await self._build_messages(user_input)
+        response_text = await self._call_groq_api(messages, max_tokens=max_tokens)
+        self._remember(user_input, response_text)
         
         return response_text
 
-# --- Initialize the Assistant ---
-try:
-    groq_api_key = os.getenv("GROQ_API_KEY")
-    if not groq_api_key:
-        raise ValueError("GROQ_API_KEY not found in environment variables. Please set it in a .env file.")
-
-    client = Groq(api_key=groq_api_key)
-    client.models.list()
-    print("Groq API key successfully validated.")
-
-    # Create a global instance of the chatbot, passing the client to it
-    assistant = SakhiChatbot(client=client)
-    print("🌸 Sakhi - Your Safety Companion is ready. 🌸")
-
-except (ValueError, AuthenticationError, APIConnectionError, APIError) as e:
-    print(f"\nFatal Initialization Error: {e}")
-    print("Sakhi cannot start. Please ensure your Groq API key is correctly set.")
-    assistant = None
-except Exception as e:
-    print(f"\nCritical startup error: {type(e).__name__} - {e}")
-    print("Sakhi cannot start due to an unforeseen issue.")
-    assistant = None
+    async def stream_message(self, user_input: str) -> AsyncIterator[str]:
+        """Streaming variant of process_message; the full reply is stored in history once the stream ends."""
+        command_response = self._handle_special_commands(user_input)
+        if command_response:
+            yield command_response
+            return
+
+        messages, max_tokens = await self._build_messages(user_input)
+        parts = []
+        async for part in self._stream_groq_api(messages, max_tokens=max_tokens):
+            parts.append(part)
+            yield part
+        self._remember(user_input, "".join(parts))
+
+# --- Initialize the Groq Client ---
+client: AsyncGroq | None = None
+
+def get_client() -> AsyncGroq:
+    """Creates the shared Groq client on first use; a failed attempt is retried on the next request."""
+    global client
+    if client is None:
+        groq_api_key = os.getenv("GROQ_API_KEY")
+        if not groq_api_key:
+            raise ValueError("GROQ_API_KEY not found in environment variables. Please set it in a .env file.")
+
+        # The async client keeps Groq round-trips from blocking the event loop, and its one
+        # HTTP/2 connection pool is reused by every session for the life of the process
+        client = AsyncGroq(
+            api_key=groq_api_key,
+            timeout=GROQ_TIMEOUT,
+            http_client=DefaultAsyncHttpxClient(http2=True, limits=GROQ_CONNECTION_LIMITS)
+        )
+        print("🌸 Sakhi - Your Safety Companion is ready. 🌸")
+    return client
+
+async def validate_groq_key():
+    """Checks the API key with one models.list() call; failures are only logged since requests retry on their own."""
+    try:
+        await get_client().models.list()
+        print("Groq API key successfully validated.")
+    except (ValueError, AuthenticationError, APIConnectionError, APIError) as e:
+        print(f"\nGroq API key validation failed: {e}")
+        print("Sakhi may not be able to reply. Please ensure your Groq API key is correctly set.")
+
+async def warm_up_groq():
+    """Sends one 1-token completion per intent so the first real user finds an open HTTP/2
+    connection and Groq's prompt cache already holding each static system prompt."""
+    async def warm(static_prompt: str):
+        async with groq_slot():
+            await get_client().chat.completions.create(
+                model=LLM_MODEL,
+                messages=[{"role": "system", "content": static_prompt}, {"role": "user", "content": "hi"}],
+                max_tokens=1
+            )
+
+    try:
+        await asyncio.gather(*(warm(prompt) for prompt in STATIC_SYSTEM_PROMPTS.values()))
+        print("Groq connection warmed up.")
+    except Exception as e:
+        print(f"Groq warm-up skipped: {e}")
+
+# --- Per-Session State ---
+# Each session gets its own SakhiChatbot so users never see each other's history or location.
+# All bots share the one Groq client. Reads and writes happen on the event loop without an
+# await in between, so no lock is needed.
+sessions: TTLCache = TTLCache(maxsize=MAX_SESSIONS, ttl=SESSION_TTL_SECONDS)
+
+def get_session(session_id: str) -> SakhiChatbot:
+    """Returns the chatbot for this session, creating it on first use and refreshing its TTL."""
+    bot = sessions.get(session_id)
+    if bot is None:
+        try:
+            bot = SakhiChatbot(client=get_client())
+        except ValueError as e:  # Building the client makes no network call, so a missing key is the only expected failure
+            print(f"\nFatal Initialization Error: {e}")
+            print("Sakhi cannot start. Please ensure your Groq API key is correctly set.")
+            raise HTTPException(status_code=500, detail="Chatbot is not initialized. Please check the server logs.")
+        except Exception as e:
+            print(f"\nCritical startup error: {type(e).__name__} - {e}")
+            print("Sakhi cannot start due to an unforeseen issue.")
+            raise HTTPException(status_code=500, detail="Chatbot is not initialized. Please check the server logs.")
+    sessions[session_id] = bot
+    return bot
+
+# --- Request Coalescing ---
+# Identical messages for the same session (double submits, client retries) that arrive while the
+# first one is still being answered share its reply instead of each making their own Groq calls.
+inflight_replies: Dict[Tuple[str, str], asyncio.Task] = {}
+
+async def coalesced_reply(session_id: str, assistant: SakhiChatbot, user_input: str) -> str:
+    """Runs process_message once per in-flight (session, message) pair and hands every caller the result."""
+    key = (session_id, user_input)
+    task = inflight_replies.get(key)
+    if task is None:
+        task = asyncio.create_task(assistant.process_message(user_input))
+        inflight_replies[key] = task
+        task.add_done_callback(lambda _: inflight_replies.pop(key, None))
+    # Shielded so one caller disconnecting doesn't cancel the reply the others are waiting on
+    return await asyncio.shield(task)
 
 # --- API Endpoint for Chatting ---
-@app.post("/chat")
-async def chat(payload: ChatPayload):
+@app.post("/chat", response_model=ChatResponse)
+async def chat(payload: ChatPayload) -> ChatResponse:
     """
     Handle chat requests from the frontend.
     Receives a message, processes it with the AI assistant, and returns a reply.
     """
-    if not assistant:
-        raise HTTPException(status_code=500, detail="Chatbot is not initialized. Please check the server logs.")
-
-    user_input = payload.message
-    if not user_input.strip():
-        return ChatResponse(reply="Please say something.")
+    user_input = payload.message.strip()
+    if not user_input:
+        return ChatResponse(reply="Please say something.", session_id=payload.session_id)
 
+    session_id = payload.session_id or uuid.uuid4().hex
+    assistant = get_session(session_id)
     try:
-        response = assistant.process_message(user_input)
+        response = await coalesced_reply(session_id, assistant, user_input)
         # FIX: Ensure proper UTF-8 encoding for Hindi text
-        return ChatResponse(reply=response)
+        return ChatResponse(reply=response, session_id=session_id)
     except Exception as e:
         print(f"Error processing message: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred while processing your message.")
 
+def sse_event(payload: dict) -> bytes:
+    """Frames one Server-Sent Event; orjson writes UTF-8 directly, which keeps Hindi/Marathi chunks cheap."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatPayload):
+    """
+    Streaming version of /chat using Server-Sent Events.
+    Each event carries a JSON object with the next piece of the reply; the stream ends with [DONE].
+    The session id is returned in the X-Session-Id header.
+    """
+    user_input = payload.message.strip()
+    session_id = payload.session_id or (uuid.uuid4().hex if user_input else None)
+    assistant = get_session(session_id) if user_input else None
+
+    async def event_stream():
+        try:
+            if not assistant:
+                yield sse_event({'delta': 'Please say something.'})
+            else:
+                async for part in assistant.stream_message(user_input):
+                    yield sse_event({'delta': part})
+        except Exception as e:
+            print(f"Error streaming message: {e}")
+            yield sse_event({'error': 'An internal error occurred while processing your message.'})
+        yield b"data: [DONE]\n\n"
+
+    headers = {"X-Session-Id": session_id} if session_id else None
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
+
 # --- Server Startup ---
 if __name__ == "__main__":
-    uvicorn.run(app, host='0.0.0.0', port=5000)
+    # loop/http stay on "auto", which picks uvloop and httptools from uvicorn[standard] where they are
+    # available and falls back to asyncio/h11 elsewhere (uvloop has no Windows build).
+    # Sessions live in process memory, so keep WEB_CONCURRENCY at 1 until they move to a shared store.
+    uvicorn.run(
+        "app:app",
+        host='0.0.0.0',
+        port=5000,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        loop="auto",
+        http="auto"
+    )
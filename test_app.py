@@ -0,0 +1,144 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("GROQ_API_KEY", "gsk_test")
+
+import app  # noqa: E402
+
+
+class StubCompletions:
+    """Records classifier calls and always answers with a fixed label."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=self.label)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def make_bot(label: str = "GENERAL"):
+    completions = StubCompletions(label)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return app.SakhiChatbot(client), completions
+
+
+@pytest.mark.parametrize("message, expected", [
+    # Short distress messages
+    ("I was raped", "EMERGENCY"),
+    ("rape", "EMERGENCY"),
+    ("he hit me", "EMERGENCY"),
+    ("he beats me", "EMERGENCY"),
+    ("help", "EMERGENCY"),
+    ("HELP!!!", "EMERGENCY"),
+    ("police", "EMERGENCY"),
+    ("stalker", "EMERGENCY"),
+    ("someone is following me", "EMERGENCY"),
+    ("bachao", "EMERGENCY"),
+    ("बचाओ", "EMERGENCY"),
+    ("मदद", "EMERGENCY"),
+    ("I'm scared", "EMOTIONAL_SUPPORT"),
+    # Ambiguous words inside ordinary requests
+    ("can you help me write a cover letter", "GENERAL"),
+    ("help me understand dowry law", "LEGAL"),
+    ("मुझे कानूनी मदद चाहिए", "LEGAL"),
+    ("fir kya karu, mujhe samajh nahi aa raha", "GENERAL"),
+    ("I want to file an FIR", "LEGAL"),
+    ("how do I make a police complaint", "LEGAL"),
+    ("what does the law say about custody", "LEGAL"),
+    ("my mother-in-law makes me feel so alone", "EMOTIONAL_SUPPORT"),
+    ("any life hack for studying?", "GENERAL"),
+    ("my instagram got hacked", "CYBERCRIME"),
+    ("main bahut udaas hoon", "EMOTIONAL_SUPPORT"),
+    ("मैं बहुत उदास हूँ", "EMOTIONAL_SUPPORT"),
+    ("hi", "GENERAL"),
+    # Ambiguous keyword matches are left to the LLM, so without it they come back GENERAL
+    ("I'm safe now, not in danger anymore", "GENERAL"),
+    ("I no longer feel unsafe", "GENERAL"),
+    ("the stalker is gone and I am safe at home", "GENERAL"),
+    ("my sister was assaulted last year, can she still file an FIR", "GENERAL"),
+    ("my husband harasses me for dowry", "GENERAL"),
+    ("what is the punishment for rape in india", "GENERAL"),
+])
+def test_keyword_routing(message, expected):
+    bot, completions = make_bot()
+    assert asyncio.run(bot.classify_intent(message, use_llm_fallback=False)) == expected
+    assert not completions.calls
+
+
+def test_short_unmatched_message_reaches_llm():
+    bot, completions = make_bot("EMOTIONAL_SUPPORT")
+    app.intent_cache.clear()
+    assert asyncio.run(bot.classify_intent("he left")) == "EMOTIONAL_SUPPORT"
+    assert len(completions.calls) == 1
+
+
+@pytest.mark.parametrize("message, label", [
+    ("I'm safe now, not in danger anymore", "GENERAL"),
+    ("my husband harasses me for dowry", "LEGAL"),
+    ("what is the punishment for rape in india", "LEGAL"),
+])
+def test_ambiguous_keyword_match_reaches_llm(message, label):
+    bot, completions = make_bot(label)
+    app.intent_cache.clear()
+    assert asyncio.run(bot.classify_intent(message)) == label
+    assert len(completions.calls) == 1
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("Classification: EMOTIONAL_SUPPORT", "EMOTIONAL_SUPPORT"),
+    ("EMOTIONAL SUPPORT", "EMOTIONAL_SUPPORT"),
+    ("not an EMERGENCY, it is LEGAL", "LEGAL"),
+    ("I am not sure", "GENERAL"),
+])
+def test_classifier_reply_parsing(reply, expected):
+    bot, _ = make_bot(reply)
+    app.intent_cache.clear()
+    assert asyncio.run(bot.classify_intent("he left")) == expected
+
+
+@pytest.mark.parametrize("message", ["hi", "Thanks!", "ok"])
+def test_phatic_message_skips_llm(message):
+    bot, completions = make_bot("EMERGENCY")
+    assert asyncio.run(bot.classify_intent(message)) == "GENERAL"
+    assert not completions.calls
+
+
+def test_busy_groq_slots_return_helpline_reply(monkeypatch):
+    bot, completions = make_bot("hello")
+    monkeypatch.setattr(app, "GROQ_SLOT_TIMEOUT_SECONDS", 0.01)
+
+    async def call_with_all_slots_taken():
+        for _ in range(app.MAX_CONCURRENT_GROQ):
+            await app.groq_slots.acquire()
+        try:
+            return await bot._call_groq_api([])
+        finally:
+            for _ in range(app.MAX_CONCURRENT_GROQ):
+                app.groq_slots.release()
+
+    reply = asyncio.run(call_with_all_slots_taken())
+    assert app.RESOURCES["helplines"]["national_emergency"] in reply
+    assert not completions.calls
+
+
+def test_chat_without_session_id_gets_its_own_session(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    _, completions = make_bot("hello")
+    monkeypatch.setattr(app, "client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    http = TestClient(app.app)
+
+    first = http.post("/chat", json={"message": "/location Mumbai"}).json()
+    second = http.post("/chat", json={"message": "/location Pune"}).json()
+    assert first["session_id"] and second["session_id"] and first["session_id"] != second["session_id"]
+    assert app.sessions[first["session_id"]].user_location == "Mumbai"
+
+    again = http.post("/chat", json={"message": "/alert", "session_id": first["session_id"]}).json()
+    assert again["session_id"] == first["session_id"]
+    assert "Mumbai" in again["reply"]